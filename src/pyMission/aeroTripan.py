@@ -17,6 +17,8 @@ copyright July 2014
 # pylint: disable=E1101
 from __future__ import division
 
+import os
+
 import numpy as np
 import MBI, scipy.sparse
 
@@ -24,10 +26,41 @@ from openmdao.main.api import ImplicitComponent, Component
 from openmdao.main.datatypes.api import Array, Float
 
 
+def tripan_inputs(M, alpha, h, eta):
+    """ Return the (num_elem+1, 4) array of surrogate inputs, converting
+    from the scaled model units to the units the Tripan data is tabulated in.
+    """
+
+    inputs = np.empty((len(M), 4))
+    inputs[:, 0] = M
+    inputs[:, 1] = alpha * 180 / np.pi * 1e-1
+    inputs[:, 2] = h * 3.28 * 1e3
+    inputs[:, 3] = eta * 180 / np.pi * 1e-1
+
+    return inputs
+
+
+# Surrogates already fit by setup_surrogate, keyed on the data file path.
+_SURROGATE_CACHE = {}
+
 def setup_surrogate(surr_file):
+    """ Return the fitted CL, CD, and CM surrogates for surr_file, along with
+    the table sizes.
+
+    Every segment uses the same aero data, so the (read-only) surrogates
+    are only fit once per data file and then shared.
+    """
+
+    key = os.path.abspath(surr_file)
+    if key not in _SURROGATE_CACHE:
+        _SURROGATE_CACHE[key] = _build_surrogate(surr_file)
+
+    return list(_SURROGATE_CACHE[key])
+
+def _build_surrogate(surr_file):
+    """ Fit the MBI surrogates to the Tripan data in surr_file. """
 
     raw = np.loadtxt(surr_file+'_inputs.dat')
-    [CL, CD, CM] = np.loadtxt(surr_file+'_outputs.dat')
 
     M_num, a_num, h_num, e_num = raw[:4].astype(int)
     M_surr = raw[4:4 + M_num]
@@ -35,19 +68,9 @@ def setup_surrogate(surr_file):
     h_surr = raw[4 + M_num + a_num:4 + M_num + a_num + h_num]
     e_surr = raw[4 + M_num + a_num + h_num:]
 
-    mbi_CL = np.zeros((M_num, a_num, h_num, e_num))
-    mbi_CD = np.zeros((M_num, a_num, h_num, e_num))
-    mbi_CM = np.zeros((M_num, a_num, h_num, e_num))
-
-    count = 0
-    for i in xrange(M_num):
-        for j in xrange(a_num):
-            for k in xrange(h_num):
-                for l in xrange(e_num):
-                    mbi_CL[i][j][k][l] = CL[count]
-                    mbi_CD[i][j][k][l] = CD[count]
-                    mbi_CM[i][j][k][l] = CM[count]
-                    count += 1
+    # The data is ordered with eta varying fastest, then h, alpha, and M.
+    [mbi_CL, mbi_CD, mbi_CM] = np.loadtxt(surr_file+'_outputs.dat').reshape(
+        (3, M_num, a_num, h_num, e_num))
 
     CL_arr = MBI.MBI(mbi_CL, [M_surr, a_surr, h_surr, e_surr],
                      [M_num, a_num, h_num, e_num], [4, 4, 4, 4])
@@ -93,30 +116,17 @@ class SysTripanCLSurrogate(ImplicitComponent):
         self.num = num
         self.CL_arr = CL
         self.J_CL = [None for i in range(4)]
+        self._J_inputs = None
 
     def evaluate(self):
         """ Calculate residual for surrogate. """
 
-        n_elem = len(self.alpha)
-
-        Mach = self.M
-        alpha = self.alpha * 180 / np.pi * 1e-1
-        alt = self.h * 3.28 * 1e3
-        eta = self.eta * 180 / np.pi * 1e-1
         CL_tar = self.CL_tar
+        inputs = tripan_inputs(self.M, self.alpha, self.h, self.eta)
 
-        inputs = np.zeros((n_elem, 4))
-        inputs[:, 0] = Mach
-        inputs[:, 1] = alpha
-        inputs[:, 2] = alt
-        inputs[:, 3] = eta
-
-        CL_temp = self.CL_arr.evaluate(inputs)
-
-        CL = np.zeros(n_elem)
-        for index in xrange(n_elem):
-            CL[index] = CL_temp[index, 0]
+        CL = self.CL_arr.evaluate(inputs)[:, 0]
 
+        Mach = self.M
         flaps = Mach <= 0.4
         flaps = flaps * 5*(0.4-Mach)
 
@@ -132,23 +142,27 @@ class SysTripanCLSurrogate(ImplicitComponent):
     def provideJ(self):
         """ Calculate and save derivatives. (i.e., Jacobian) """
 
-        n_elem = len(self.alpha)
-
-        Mach = self.M
-        alpha = self.alpha * 180 / np.pi * 1e-1
-        alt = self.h * 3.28 * 1e3
-        eta = self.eta * 180 / np.pi * 1e-1
+        inputs = tripan_inputs(self.M, self.alpha, self.h, self.eta)
 
-        inputs = np.zeros((n_elem, 4))
-        inputs[:, 0] = Mach
-        inputs[:, 1] = alpha
-        inputs[:, 2] = alt
-        inputs[:, 3] = eta
+        # The jacobian is often requested again at the same point (e.g.,
+        # once the Newton solve has converged), so skip the re-evaluation.
+        if self._J_inputs is not None and \
+           np.array_equal(inputs, self._J_inputs):
+            return
+        self._J_inputs = inputs
 
-        for index in xrange(4):
+        for index in range(4):
             self.J_CL[index] = self.CL_arr.evaluate(inputs,
                                                     1+index, 0)[:, 0]
 
+        # Fold the flaps term and unit scaling in once here, since the
+        # linear solver applies these many times per linearization.
+        flaps = self.M <= 0.4
+        self.J_CL[0] = self.J_CL[0] + flaps * (-5)
+        self.J_CL[1] *= 180 / np.pi * 1e-1
+        self.J_CL[2] *= 3.28 * 1e3
+        self.J_CL[3] *= 180 / np.pi * 1e-1
+
     def apply_deriv(self, arg, result):
         """ Compute the derivatives of lift and drag coefficient wrt alpha,
         eta, aspect ratio, and Osawld's efficiency.
@@ -158,20 +172,17 @@ class SysTripanCLSurrogate(ImplicitComponent):
         dres = result['alpha_res']
 
         if 'M' in arg:
-            flaps = self.M <= 0.4
-            flaps = flaps * (-5)
             dMach = arg['M']
-            dres[:] += (self.J_CL[0]+flaps) * dMach
-
+            dres[:] += self.J_CL[0] * dMach
         if 'alpha' in arg:
             dalpha = arg['alpha']
-            dres[:] += self.J_CL[1] * dalpha * 180 / np.pi * 1e-1
+            dres[:] += self.J_CL[1] * dalpha
         if 'h' in arg:
             dalt = arg['h']
-            dres[:] += self.J_CL[2] * dalt * 3.28 * 1e3
+            dres[:] += self.J_CL[2] * dalt
         if 'eta' in arg:
             deta = arg['eta']
-            dres[:] += self.J_CL[3] * deta * 180 / np.pi * 1e-1
+            dres[:] += self.J_CL[3] * deta
         if 'CL_tar' in arg:
             dCL = arg['CL_tar']
             dres[:] -= dCL
@@ -185,20 +196,17 @@ class SysTripanCLSurrogate(ImplicitComponent):
         dres = arg['alpha_res']
 
         if 'M' in result:
-            flaps = self.M <= 0.4
-            flaps = flaps * (-5)
             dMach = result['M']
-            dMach[:] += (self.J_CL[0]+flaps) * dres
-
+            dMach[:] += self.J_CL[0] * dres
         if 'alpha' in result:
             dalpha = result['alpha']
-            dalpha[:] += self.J_CL[1] * dres * 180 / np.pi * 1e-1
+            dalpha[:] += self.J_CL[1] * dres
         if 'h' in result:
             dalt = result['h']
-            dalt[:] += self.J_CL[2] * dres * 3.28 * 1e3
+            dalt[:] += self.J_CL[2] * dres
         if 'eta' in result:
             deta = result['eta']
-            deta[:] += self.J_CL[3] * dres * 180 / np.pi * 1e-1
+            deta[:] += self.J_CL[3] * dres
         if 'CL_tar' in result:
             dCL = result['CL_tar']
             dCL[:] -= dres
@@ -227,29 +235,16 @@ class SysTripanCDSurrogate(Component):
         self.num = num
         self.CD_arr = CD
         self.J_CD = [None for i in range(4)]
+        self._J_inputs = None
 
     def execute(self):
         """ Calculate residual for surrogate. """
 
-        n_elem = len(self.alpha)
-
-        Mach = self.M
-        alpha = self.alpha * 180 / np.pi * 1e-1
-        alt = self.h * 3.28 * 1e3
-        eta = self.eta * 180 / np.pi * 1e-1
+        inputs = tripan_inputs(self.M, self.alpha, self.h, self.eta)
 
-        inputs = np.zeros((n_elem, 4))
-        inputs[:, 0] = Mach
-        inputs[:, 1] = alpha
-        inputs[:, 2] = alt
-        inputs[:, 3] = eta
-
-        CD_temp = self.CD_arr.evaluate(inputs)
-
-        CD = np.zeros(n_elem)
-        for index in xrange(n_elem):
-            CD[index] = CD_temp[index, 0] / 1e-1 + 0.015/1e-1
+        CD = self.CD_arr.evaluate(inputs)[:, 0] / 1e-1 + 0.015/1e-1
 
+        Mach = self.M
         flaps = Mach <= 0.4
         flaps = flaps * 0.25*(0.4-Mach)
 
@@ -265,23 +260,26 @@ class SysTripanCDSurrogate(Component):
     def provideJ(self):
         """ Calculate and save derivatives. (i.e., Jacobian) """
 
-        n_elem = len(self.alpha)
-
-        Mach = self.M
-        alpha = self.alpha * 180 / np.pi * 1e-1
-        alt = self.h * 3.28 * 1e3
-        eta = self.eta * 180 / np.pi * 1e-1
+        inputs = tripan_inputs(self.M, self.alpha, self.h, self.eta)
 
-        inputs = np.zeros((n_elem, 4))
-        inputs[:, 0] = Mach
-        inputs[:, 1] = alpha
-        inputs[:, 2] = alt
-        inputs[:, 3] = eta
+        # Nothing to do if we are still at the last linearization point.
+        if self._J_inputs is not None and \
+           np.array_equal(inputs, self._J_inputs):
+            return
+        self._J_inputs = inputs
 
-        for index in xrange(4):
+        for index in range(4):
             self.J_CD[index] = self.CD_arr.evaluate(inputs,
                                                     1+index, 0)[:, 0]
 
+        # Fold the flaps term and unit scaling in once here, since the
+        # linear solver applies these many times per linearization.
+        flaps = self.M <= 0.4
+        self.J_CD[0] = (self.J_CD[0] + flaps * (-0.25)) / 1e-1
+        self.J_CD[1] *= 180 / np.pi
+        self.J_CD[2] *= 3.28 * 1e3 / 1e-1
+        self.J_CD[3] *= 180 / np.pi
+
     def apply_deriv(self, arg, result):
         """ Compute the derivatives of lift and drag coefficient wrt alpha,
         eta, aspect ratio, and Osawld's efficiency.
@@ -291,19 +289,17 @@ class SysTripanCDSurrogate(Component):
         dCD = result['CD']
 
         if 'M' in arg:
-            flaps = self.M <= 0.4
-            flaps = flaps * (-0.25)
             dMach = arg['M']
-            dCD[:] += (self.J_CD[0]+flaps) * dMach / 1e-1
+            dCD[:] += self.J_CD[0] * dMach
         if 'alpha' in arg:
             dalpha = arg['alpha']
-            dCD[:] += self.J_CD[1] * dalpha * 180 / np.pi
+            dCD[:] += self.J_CD[1] * dalpha
         if 'h' in arg:
             dalt = arg['h']
-            dCD[:] += self.J_CD[2] * dalt * 3.28 * 1e3 / 1e-1
+            dCD[:] += self.J_CD[2] * dalt
         if 'eta' in arg:
             deta = arg['eta']
-            dCD[:] += self.J_CD[3] * deta * 180 / np.pi
+            dCD[:] += self.J_CD[3] * deta
 
     def apply_derivT(self, arg, result):
         """ Compute the derivatives of lift and drag coefficient wrt alpha,
@@ -314,19 +310,17 @@ class SysTripanCDSurrogate(Component):
         dCD = arg['CD']
 
         if 'M' in result:
-            flaps = self.M <= 0.4
-            flaps = flaps * (-0.25)
             dMach = result['M']
-            dMach[:] += (self.J_CD[0]+flaps) * dCD / 1e-1
+            dMach[:] += self.J_CD[0] * dCD
         if 'alpha' in result:
             dalpha = result['alpha']
-            dalpha[:] += self.J_CD[1] * dCD * 180 / np.pi
+            dalpha[:] += self.J_CD[1] * dCD
         if 'h' in result:
             dalt = result['h']
-            dalt[:] += self.J_CD[2] * dCD * 3.28 * 1e3 / 1e-1
+            dalt[:] += self.J_CD[2] * dCD
         if 'eta' in result:
             deta = result['eta']
-            deta[:] += self.J_CD[3] * dCD * 180 / np.pi
+            deta[:] += self.J_CD[3] * dCD
 
 class SysTripanCMSurrogate(ImplicitComponent):
     """ Tripan CM Surrogate Model"""
@@ -353,29 +347,15 @@ class SysTripanCMSurrogate(ImplicitComponent):
         self.num = num
         self.CM_arr = CM
         self.J_CM = [None for i in range(4)]
+        self._J_inputs = None
 
     def evaluate(self):
         """ Evaluate residual for surrogate. """
 
-        n_elem = len(self.alpha)
-
-        Mach = self.M
-        alpha = self.alpha * 180 / np.pi * 1e-1
-        alt = self.h * 3.28 * 1e3
-        eta = self.eta * 180 / np.pi * 1e-1
         res = self.CM
+        inputs = tripan_inputs(self.M, self.alpha, self.h, self.eta)
 
-        inputs = np.zeros((n_elem, 4))
-        inputs[:, 0] = Mach
-        inputs[:, 1] = alpha
-        inputs[:, 2] = alt
-        inputs[:, 3] = eta
-
-        CM_temp = self.CM_arr.evaluate(inputs)
-
-        CD = np.zeros(n_elem)
-        for index in xrange(n_elem):
-            res[index] = CM_temp[index, 0]
+        res[:] = self.CM_arr.evaluate(inputs)[:, 0]
 
     def list_deriv_vars(self):
         """ Return lists of inputs and outputs where we defined derivatives.
@@ -387,23 +367,24 @@ class SysTripanCMSurrogate(ImplicitComponent):
     def provideJ(self):
         """ Calculate and save derivatives. (i.e., Jacobian) """
 
-        n_elem = len(self.alpha)
-
-        Mach = self.M
-        alpha = self.alpha * 180 / np.pi * 1e-1
-        alt = self.h * 3.28 * 1e3
-        eta = self.eta * 180 / np.pi * 1e-1
+        inputs = tripan_inputs(self.M, self.alpha, self.h, self.eta)
 
-        inputs = np.zeros((n_elem, 4))
-        inputs[:, 0] = Mach
-        inputs[:, 1] = alpha
-        inputs[:, 2] = alt
-        inputs[:, 3] = eta
+        # Nothing to do if we are still at the last linearization point.
+        if self._J_inputs is not None and \
+           np.array_equal(inputs, self._J_inputs):
+            return
+        self._J_inputs = inputs
 
-        for index in xrange(4):
+        for index in range(4):
             self.J_CM[index] = self.CM_arr.evaluate(inputs,
                                                     1+index, 0)[:, 0]
 
+        # Fold the unit scaling in once here, since the linear solver
+        # applies these many times per linearization.
+        self.J_CM[1] *= 180 / np.pi * 1e-1
+        self.J_CM[2] *= 3.28 * 1e3
+        self.J_CM[3] *= 180 / np.pi * 1e-1
+
     def apply_deriv(self, arg, result):
         """ Compute the derivatives of lift and drag coefficient wrt alpha,
         eta, aspect ratio, and Osawld's efficiency.
@@ -417,13 +398,13 @@ class SysTripanCMSurrogate(ImplicitComponent):
             dres[:] += self.J_CM[0] * dMach
         if 'alpha' in arg:
             dalpha = arg['alpha']
-            dres[:] += self.J_CM[1] * dalpha * 180 / np.pi * 1e-1
+            dres[:] += self.J_CM[1] * dalpha
         if 'h' in arg:
             dalt = arg['h']
-            dres[:] += self.J_CM[2] * dalt * 3.28 * 1e3
+            dres[:] += self.J_CM[2] * dalt
         if 'eta' in arg:
             deta = arg['eta']
-            dres[:] += self.J_CM[3] * deta * 180 / np.pi * 1e-1
+            dres[:] += self.J_CM[3] * deta
 
     def apply_derivT(self, arg, result):
         """ Compute the derivatives of lift and drag coefficient wrt alpha,
@@ -438,11 +419,11 @@ class SysTripanCMSurrogate(ImplicitComponent):
             dMach[:] += self.J_CM[0] * dres
         if 'alpha' in result:
             dalpha = result['alpha']
-            dalpha[:] += self.J_CM[1] * dres * 180 / np.pi * 1e-1
+            dalpha[:] += self.J_CM[1] * dres
         if 'h' in result:
             dalt = result['h']
-            dalt[:] += self.J_CM[2] * dres * 3.28 * 1e3
+            dalt[:] += self.J_CM[2] * dres
         if 'eta' in result:
             deta = result['eta']
-            deta[:] += self.J_CM[3] * dres * 180 / np.pi * 1e-1
+            deta[:] += self.J_CM[3] * dres
 
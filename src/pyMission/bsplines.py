@@ -29,7 +29,23 @@ from openmdao.main.datatypes.api import Array, Float, Bool
 # Allow non-standard variable names for scientific calc
 # pylint: disable=C0103
 
+# Jacobians already generated by setup_MBI, keyed on the discretization.
+_MBI_CACHE = {}
+
 def setup_MBI(num_pts, num_cp, x_init):
+    """ generate jacobians for b-splines using MBI package
+
+    Segments with the same discretization share the same (read-only)
+    jacobians, so they are only generated once.
+    """
+
+    key = (num_pts, num_cp, tuple(x_init))
+    if key not in _MBI_CACHE:
+        _MBI_CACHE[key] = _build_MBI(num_pts, num_cp, x_init)
+
+    return _MBI_CACHE[key]
+
+def _build_MBI(num_pts, num_cp, x_init):
     """ generate jacobians for b-splines using MBI package """
 
     alt = np.linspace(0, 16, num_pts)
@@ -47,7 +63,18 @@ def setup_MBI(num_pts, num_cp, x_init):
                                     (lins,lins)))
     jace = diag.dot(jacd)
 
-    return jac, jace
+    # The spline systems only ever apply these, so store them in CSR form.
+    return jac.tocsr(), jace.tocsr()
+
+def transpose_jac(jac):
+    """ Return the transpose of a b-spline jacobian in CSR form so that
+    adjoint products are as cheap as forward ones.
+    """
+
+    if jac is None:
+        return None
+
+    return jac.T.tocsr()
 
 
 class BSplineSystem(Component):
@@ -80,6 +107,7 @@ class SysXBspline(BSplineSystem):
                             desc = 'b-spline parameterization for distance'))
 
         self.jac_h = jac_h
+        self.jac_h_T = transpose_jac(jac_h)
 
     def execute(self):
         """ Compute x b-spline values with x control point values using
@@ -113,7 +141,7 @@ class SysXBspline(BSplineSystem):
         Adjoint mode.
         """
 
-        result['x_pt'] += self.jac_h.T.dot(arg['x'])
+        result['x_pt'] += self.jac_h_T.dot(arg['x'])
 
 
 class SysHBspline(BSplineSystem):
@@ -131,6 +159,7 @@ class SysHBspline(BSplineSystem):
                             desc = 'b-spline parameterization for altitude'))
 
         self.jac_h = jac_h
+        self.jac_h_T = transpose_jac(jac_h)
 
     def execute(self):
         """ Compute h b-splines values using h control point values using
@@ -164,7 +193,7 @@ class SysHBspline(BSplineSystem):
         Adjoint mode.
         """
 
-        result['h_pt'] += self.jac_h.T.dot(arg['h'])
+        result['h_pt'] += self.jac_h_T.dot(arg['h'])
 
 
 class SysMVBspline(BSplineSystem):
@@ -186,14 +215,18 @@ class SysMVBspline(BSplineSystem):
                             desc = 'b-spline parameterization for velocity'))
 
         self.jac_h = jac_h
+        self.jac_h_T = transpose_jac(jac_h)
 
     def execute(self):
         """ Compute M b-spline values using M control point values using
         pre-calculated MBI jacobian.
         """
 
-        self.M = self.jac_h.dot(self.M_pt)
-        self.v_spline = self.jac_h.dot(self.v_pt)
+        # Both splines share jac_h, so apply it to both sets of control
+        # points in a single sparse product.
+        M_v = self.jac_h.dot(np.column_stack((self.M_pt, self.v_pt)))
+        self.M = M_v[:, 0].copy()
+        self.v_spline = M_v[:, 1].copy()
 
     def list_deriv_vars(self):
         """ Return lists of inputs and outputs where we defined derivatives.
@@ -224,9 +257,9 @@ class SysMVBspline(BSplineSystem):
         """
 
         if 'M_pt' in result and 'M' in arg:
-            result['M_pt'] += self.jac_h.T.dot(arg['M'])
+            result['M_pt'] += self.jac_h_T.dot(arg['M'])
         if 'v_pt' in result and 'v_spline' in arg:
-            result['v_pt'] += self.jac_h.T.dot(arg['v_spline'])
+            result['v_pt'] += self.jac_h_T.dot(arg['v_spline'])
 
 
 class SysGammaBspline(BSplineSystem):
@@ -245,6 +278,7 @@ class SysGammaBspline(BSplineSystem):
                             'parameterization'))
 
         self.jac_gamma = jac_gamma
+        self.jac_gamma_T = transpose_jac(jac_gamma)
 
     def execute(self):
         """ Compute gamma b-spline values using gamma control point values
@@ -278,4 +312,4 @@ class SysGammaBspline(BSplineSystem):
         Adjoint mode.
         """
 
-        result['h_pt'] += self.jac_gamma.T.dot(arg['Gamma']) * 1e3/1e-1
+        result['h_pt'] += self.jac_gamma_T.dot(arg['Gamma']) * 1e3/1e-1
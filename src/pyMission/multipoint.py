@@ -1,5 +1,7 @@
 ''' Analysis with multiple mission segments in parallel '''
 
+from __future__ import print_function
+
 import time
 
 import numpy as np
@@ -16,144 +18,74 @@ from pyMission.segment import MissionSegment
 num_elem = 250
 num_cp = 50
 
-model = set_as_top(Assembly())
-
-#------------------------
-# Mission Segment 1
-#------------------------
-
-x_range = 9000.0  # nautical miles
-
 # define bounds for the flight path angle
 gamma_lb = np.tan(-35.0 * (np.pi/180.0))/1e-1
 gamma_ub = np.tan(35.0 * (np.pi/180.0))/1e-1
 takeoff_speed = 83.3
 landing_speed = 72.2
 
-altitude = 10 * np.sin(np.pi * np.linspace(0,1,num_elem+1))
-
-start = time.time()
-
-x_range *= 1.852
-x_init = x_range * 1e3 * (1-np.cos(np.linspace(0, 1, num_cp)*np.pi))/2/1e6
-M_init = np.ones(num_cp)*0.82
-h_init = 10 * np.sin(np.pi * x_init / (x_range/1e3))
+# Cosine-spaced control point distribution on [0, 1], shared by all
+# segments; x_init is just this scaled by the range.
+cp_dist = 0.5*(1.0 - np.cos(np.pi*np.linspace(0.0, 1.0, num_cp)))
 
-model.add('seg1', MissionSegment(num_elem=num_elem, num_cp=num_cp,
-                                 x_pts=x_init, surr_file='crm_surr'))
+# Initial altitude profile used to fit h_pt; the same for every segment.
+altitude = 10 * np.sin(np.pi * np.linspace(0,1,num_elem+1))
 
-# Initial value of the parameter
-model.seg1.h_pt = h_init
-model.seg1.M_pt = M_init
-model.seg1.set_init_h_pt(altitude)
 
-# Calculate velocity from the Mach we have specified.
-model.seg1.SysSpeed.v_specified = False
+def _build_segment(model, name, x_range):
+    """ Add a mission segment of range x_range (nautical miles) to model
+    under the given name, and set its initial values and design
+    parameters.
+    """
 
-# Initial design parameters
-model.seg1.S = 427.8/1e2
-model.seg1.ac_w = 210000*9.81/1e6
-model.seg1.thrust_sl = 1020000.0/1e6
-model.seg1.SFCSL = 8.951*9.81
-model.seg1.AR = 8.68
-model.seg1.oswald = 0.8
+    x_range *= 1.852
+    x_init = x_range * 1e-3 * cp_dist
+    M_init = np.ones(num_cp)*0.82
 
-# Flag for making sure we run serial if we do an mpirun
-model.seg1.driver.system_type = 'serial'
-model.seg1.coupled_solver.system_type = 'serial'
+    model.add(name, MissionSegment(num_elem=num_elem, num_cp=num_cp,
+                                   x_pts=x_init, surr_file='crm_surr'))
+    seg = getattr(model, name)
 
-#------------------------
-# Mission Segment 2
-#------------------------
+    # Initial value of the parameter (h_pt is fit to the altitude profile)
+    seg.M_pt = M_init
+    seg.set_init_h_pt(altitude)
 
-x_range = 7000.0  # nautical miles
+    # Calculate velocity from the Mach we have specified.
+    seg.SysSpeed.v_specified = False
 
-# define bounds for the flight path angle
-gamma_lb = np.tan(-35.0 * (np.pi/180.0))/1e-1
-gamma_ub = np.tan(35.0 * (np.pi/180.0))/1e-1
-takeoff_speed = 83.3
-landing_speed = 72.2
+    # Initial design parameters
+    seg.S = 427.8/1e2
+    seg.ac_w = 210000*9.81/1e6
+    seg.thrust_sl = 1020000.0/1e6
+    seg.SFCSL = 8.951*9.81
+    seg.AR = 8.68
+    seg.oswald = 0.8
 
-altitude = 10 * np.sin(np.pi * np.linspace(0,1,num_elem+1))
-
-start = time.time()
+    # Flag for making sure we run serial if we do an mpirun
+    seg.driver.system_type = 'serial'
+    seg.coupled_solver.system_type = 'serial'
 
-x_range *= 1.852
-x_init = x_range * 1e3 * (1-np.cos(np.linspace(0, 1, num_cp)*np.pi))/2/1e6
-M_init = np.ones(num_cp)*0.82
-h_init = 10 * np.sin(np.pi * x_init / (x_range/1e3))
+    return seg
 
-model.add('seg2', MissionSegment(num_elem=num_elem, num_cp=num_cp,
-                                 x_pts=x_init, surr_file='crm_surr'))
 
-# Initial value of the parameter
-model.seg2.h_pt = h_init
-model.seg2.M_pt = M_init
-model.seg2.set_init_h_pt(altitude)
-
-# Calculate velocity from the Mach we have specified.
-model.seg2.SysSpeed.v_specified = False
-
-# Initial design parameters
-model.seg2.S = 427.8/1e2
-model.seg2.ac_w = 210000*9.81/1e6
-model.seg2.thrust_sl = 1020000.0/1e6
-model.seg2.SFCSL = 8.951*9.81
-model.seg2.AR = 8.68
-model.seg2.oswald = 0.8
-
-# Flag for making sure we run serial if we do an mpirun
-model.seg2.driver.system_type = 'serial'
-model.seg2.coupled_solver.system_type = 'serial'
+model = set_as_top(Assembly())
 
 #------------------------
-# Mission Segment 3
+# Mission Segments
 #------------------------
 
-x_range = 5000.0  # nautical miles
-
-# define bounds for the flight path angle
-gamma_lb = np.tan(-35.0 * (np.pi/180.0))/1e-1
-gamma_ub = np.tan(35.0 * (np.pi/180.0))/1e-1
-takeoff_speed = 83.3
-landing_speed = 72.2
-
-altitude = 10 * np.sin(np.pi * np.linspace(0,1,num_elem+1))
-
-start = time.time()
-
-x_range *= 1.852
-x_init = x_range * 1e3 * (1-np.cos(np.linspace(0, 1, num_cp)*np.pi))/2/1e6
-M_init = np.ones(num_cp)*0.82
-h_init = 10 * np.sin(np.pi * x_init / (x_range/1e3))
-
-model.add('seg3', MissionSegment(num_elem=num_elem, num_cp=num_cp,
-                                 x_pts=x_init, surr_file='crm_surr'))
-
-# Initial value of the parameter
-model.seg3.h_pt = h_init
-model.seg3.M_pt = M_init
-model.seg3.set_init_h_pt(altitude)
-
-# Calculate velocity from the Mach we have specified.
-model.seg3.SysSpeed.v_specified = False
-
-# Initial design parameters
-model.seg3.S = 427.8/1e2
-model.seg3.ac_w = 210000*9.81/1e6
-model.seg3.thrust_sl = 1020000.0/1e6
-model.seg3.SFCSL = 8.951*9.81
-model.seg3.AR = 8.68
-model.seg3.oswald = 0.8
-
-# Flag for making sure we run serial if we do an mpirun
-model.seg3.driver.system_type = 'serial'
-model.seg3.coupled_solver.system_type = 'serial'
+_build_segment(model, 'seg1', 9000.0)
+_build_segment(model, 'seg2', 7000.0)
+_build_segment(model, 'seg3', 5000.0)
 
 #----------------------
 # Prepare to Run
 #----------------------
 
+# The segments share no connections, so under mpirun the framework
+# partitions this workflow into a parallel system and gives each segment
+# its own subset of the processes. Each segment's internals are kept
+# serial above.
 model.driver.workflow.add(['seg1', 'seg2', 'seg3'])
 
 #model._setup()
@@ -163,20 +95,25 @@ model.driver.workflow.add(['seg1', 'seg2', 'seg3'])
 start = time.time()
 model.run()
 
-print "."
+print(".")
 if MPI:
+    # Each segment's fuel burn is only valid on the processes running that
+    # segment, so reduce with MAX to collect them all on the root.
     comm = model._system.mpi.comm
-    fuelburn = (model.seg1.SysFuelObj.fuelburn, model.seg2.SysFuelObj.fuelburn, 
-                model.seg3.SysFuelObj.fuelburn)
-    dist_seg = comm.gather(fuelburn, root=0)
+    fuelburn = np.array([model.seg1.SysFuelObj.fuelburn,
+                         model.seg2.SysFuelObj.fuelburn,
+                         model.seg3.SysFuelObj.fuelburn])
+    max_fuelburn = np.zeros(3)
+    comm.Reduce([fuelburn, MPI.DOUBLE], [max_fuelburn, MPI.DOUBLE],
+                op=MPI.MAX, root=0)
     if MPI.COMM_WORLD.rank == 0:
-        
-        print "seg1 fuel burn", max(dist_seg[0][0], dist_seg[1][0], dist_seg[2][0])
-        print "seg2 fuel burn", max(dist_seg[0][1], dist_seg[1][1], dist_seg[2][1])
-        print "seg3 fuel burn", max(dist_seg[0][2], dist_seg[1][2], dist_seg[2][2])
+
+        print("seg1 fuel burn", max_fuelburn[0])
+        print("seg2 fuel burn", max_fuelburn[1])
+        print("seg3 fuel burn", max_fuelburn[2])
 else:
-    print "seg1 fuel burn", model.seg1.SysFuelObj.fuelburn
-    print "seg2 fuel burn", model.seg2.SysFuelObj.fuelburn
-    print "seg3 fuel burn", model.seg3.SysFuelObj.fuelburn
-print 'Simulation TIME:', time.time() - start
+    print("seg1 fuel burn", model.seg1.SysFuelObj.fuelburn)
+    print("seg2 fuel burn", model.seg2.SysFuelObj.fuelburn)
+    print("seg3 fuel burn", model.seg3.SysFuelObj.fuelburn)
+print('Simulation TIME:', time.time() - start)
 
@@ -14,8 +14,8 @@ copyright July 2014
 """
 
 # pylint: disable=E1101
+from __future__ import print_function
 import numpy as np
-import scipy.sparse.linalg
 
 from openmdao.lib.drivers.api import NewtonSolver, FixedPointIterator, BroydenSolver
 from openmdao.main.api import Assembly, set_as_top, Driver
@@ -37,9 +37,91 @@ def is_differentiable(self):
 Driver.is_differentiable = is_differentiable
 
 
+# Data connections inside a segment, grouped by the component they feed.
+_CONNECTIONS = [
+    # Atmospherics
+    ('SFCSL', 'SysSFC.SFCSL'),
+    ('SysHBspline.h', 'SysSFC.h'),
+    ('SysHBspline.h', 'SysTemp.h'),
+    ('SysHBspline.h', 'SysRho.h'),
+    ('SysTemp.temp', 'SysRho.temp'),
+    ('SysTemp.temp', 'SysSpeed.temp'),
+    ('SysMVBspline.M', 'SysSpeed.M'),
+    ('SysMVBspline.v_spline', 'SysSpeed.v_spline'),
+
+    # Vertical Equilibrium
+    ('S', 'SysCLTar.S'),
+    ('ac_w', 'SysCLTar.ac_w'),
+    ('SysRho.rho', 'SysCLTar.rho'),
+    ('SysGammaBspline.Gamma', 'SysCLTar.Gamma'),
+    ('SysSpeed.v', 'SysCLTar.v'),
+
+    # Tripan Alpha
+    ('SysMVBspline.M', 'SysTripanCLSurrogate.M'),
+    ('SysHBspline.h', 'SysTripanCLSurrogate.h'),
+    ('SysCLTar.CL', 'SysTripanCLSurrogate.CL_tar'),
+
+    # Tripan Eta
+    ('SysMVBspline.M', 'SysTripanCMSurrogate.M'),
+    ('SysHBspline.h', 'SysTripanCMSurrogate.h'),
+    ('SysTripanCLSurrogate.alpha', 'SysTripanCMSurrogate.alpha'),
+
+    # Tripan Drag
+    ('SysMVBspline.M', 'SysTripanCDSurrogate.M'),
+    ('SysHBspline.h', 'SysTripanCDSurrogate.h'),
+    ('SysTripanCMSurrogate.eta', 'SysTripanCDSurrogate.eta'),
+    ('SysTripanCLSurrogate.alpha', 'SysTripanCDSurrogate.alpha'),
+
+    # Horizontal Equilibrium
+    ('SysGammaBspline.Gamma', 'SysCTTar.Gamma'),
+    ('SysTripanCDSurrogate.CD', 'SysCTTar.CD'),
+    ('SysTripanCLSurrogate.alpha', 'SysCTTar.alpha'),
+    ('SysRho.rho', 'SysCTTar.rho'),
+    ('SysSpeed.v', 'SysCTTar.v'),
+    ('S', 'SysCTTar.S'),
+    ('ac_w', 'SysCTTar.ac_w'),
+
+    # Weight
+    ('SysSpeed.v', 'SysFuelWeight.v'),
+    ('SysGammaBspline.Gamma', 'SysFuelWeight.Gamma'),
+    ('SysCTTar.CT_tar', 'SysFuelWeight.CT_tar'),
+    ('SysXBspline.x', 'SysFuelWeight.x'),
+    ('SysSFC.SFC', 'SysFuelWeight.SFC'),
+    ('SysRho.rho', 'SysFuelWeight.rho'),
+    ('S', 'SysFuelWeight.S'),
+
+    # Coupled system cycles. Direct connections (cycles) are faster.
+    ('SysFuelWeight.fuel_w', 'SysCLTar.fuel_w'),
+    ('SysCTTar.CT_tar', 'SysCLTar.CT_tar'),
+    ('SysTripanCLSurrogate.alpha', 'SysCLTar.alpha'),
+    ('SysTripanCMSurrogate.eta', 'SysTripanCLSurrogate.eta'),
+    ('SysFuelWeight.fuel_w', 'SysCTTar.fuel_w'),
+
+    # Functionals
+    ('S', 'SysTau.S'),
+    ('thrust_sl', 'SysTau.thrust_sl'),
+    ('SysRho.rho', 'SysTau.rho'),
+    ('SysCTTar.CT_tar', 'SysTau.CT_tar'),
+    ('SysHBspline.h', 'SysTau.h'),
+    ('SysSpeed.v', 'SysTau.v'),
+    ('SysTau.tau', 'SysTmin.tau'),
+    ('SysTau.tau', 'SysTmax.tau'),
+    #('SysGammaBspline.Gamma', 'SysSlopeMin.Gamma'),
+    #('SysGammaBspline.Gamma', 'SysSlopeMax.Gamma'),
+    ('SysFuelWeight.fuel_w', 'SysFuelObj.fuel_w'),
+    #('SysHBspline.h', 'SysHi.h'),
+    #('SysHBspline.h', 'SysHf.h'),
+    ('SysXBspline.x', 'SysBlockTime.x'),
+    ('SysSpeed.v', 'SysBlockTime.v'),
+    ('SysGammaBspline.Gamma', 'SysBlockTime.Gamma'),
+]
+
+
 class MissionSegment(Assembly):
     """ Defines a single segment for the Mission Analysis. """
 
+    # Pseudo-inverses of jac_h for set_init_h_pt, keyed on id(jac_h).
+    _pinvs = {}
 
     def __init__(self, num_elem=10, num_cp=5, x_pts=None, surr_file=None):
         """Initialize this segment trajectory problem.
@@ -85,7 +167,6 @@ class MissionSegment(Assembly):
         self.add('oswald', Float(0.0, iotype='in',
                                  desc = "Oswald's efficiency"))
 
-
         # Splines
         self.add('SysXBspline', SysXBspline(num_elem=self.num_elem,
                                             num_pt=self.num_pt,
@@ -108,24 +189,12 @@ class MissionSegment(Assembly):
                                             x_init=self.x_pts,
                                             jac_gamma=self.jac_gamma))
 
-
-
         # Atmospherics
         self.add('SysSFC', SysSFC(num_elem=self.num_elem))
         self.add('SysTemp', SysTemp(num_elem=self.num_elem))
         self.add('SysRho', SysRho(num_elem=self.num_elem))
         self.add('SysSpeed', SysSpeed(num_elem=self.num_elem))
 
-        self.connect('SFCSL', 'SysSFC.SFCSL')
-        self.connect('SysHBspline.h', 'SysSFC.h')
-        self.connect('SysHBspline.h', 'SysTemp.h')
-        self.connect('SysHBspline.h', 'SysRho.h')
-        self.connect('SysTemp.temp', 'SysRho.temp')
-        self.connect('SysTemp.temp', 'SysSpeed.temp')
-        self.connect('SysMVBspline.M', 'SysSpeed.M')
-        self.connect('SysMVBspline.v_spline', 'SysSpeed.v_spline')
-
-
         # -----------------------------------
         # Comps for Coupled System begin here
         # -----------------------------------
@@ -133,60 +202,28 @@ class MissionSegment(Assembly):
         # Vertical Equilibrium
         self.add('SysCLTar', SysCLTar(num_elem=self.num_elem))
 
-        self.connect('S', 'SysCLTar.S')
-        self.connect('ac_w', 'SysCLTar.ac_w')
-        self.connect('SysRho.rho', 'SysCLTar.rho')
-        self.connect('SysGammaBspline.Gamma', 'SysCLTar.Gamma')
-        self.connect('SysSpeed.v', 'SysCLTar.v')
-
         # Tripan Alpha
         self.add('SysTripanCLSurrogate', SysTripanCLSurrogate(num_elem=self.num_elem,
                                                               num=self.num,
                                                               CL=self.CL_arr))
-        self.connect('SysMVBspline.M', 'SysTripanCLSurrogate.M')
-        self.connect('SysHBspline.h', 'SysTripanCLSurrogate.h')
-        self.connect('SysCLTar.CL', 'SysTripanCLSurrogate.CL_tar')
 
         # Tripan Eta
         self.add('SysTripanCMSurrogate', SysTripanCMSurrogate(num_elem=self.num_elem,
                                                               num=self.num,
                                                               CM=self.CM_arr))
-        self.connect('SysMVBspline.M', 'SysTripanCMSurrogate.M')
-        self.connect('SysHBspline.h', 'SysTripanCMSurrogate.h')
-        self.connect('SysTripanCLSurrogate.alpha', 'SysTripanCMSurrogate.alpha')
 
         # Tripan Drag
         self.add('SysTripanCDSurrogate', SysTripanCDSurrogate(num_elem=self.num_elem,
                                                               num=self.num,
                                                               CD=self.CD_arr))
-        self.connect('SysMVBspline.M', 'SysTripanCDSurrogate.M')
-        self.connect('SysHBspline.h', 'SysTripanCDSurrogate.h')
-        self.connect('SysTripanCMSurrogate.eta', 'SysTripanCDSurrogate.eta')
-        self.connect('SysTripanCLSurrogate.alpha', 'SysTripanCDSurrogate.alpha')
 
         # Horizontal Equilibrium
         self.add('SysCTTar', SysCTTar(num_elem=self.num_elem))
 
-        self.connect('SysGammaBspline.Gamma', 'SysCTTar.Gamma')
-        self.connect('SysTripanCDSurrogate.CD', 'SysCTTar.CD')
-        self.connect('SysTripanCLSurrogate.alpha', 'SysCTTar.alpha')
-        self.connect('SysRho.rho', 'SysCTTar.rho')
-        self.connect('SysSpeed.v', 'SysCTTar.v')
-        self.connect('S', 'SysCTTar.S')
-        self.connect('ac_w', 'SysCTTar.ac_w')
-
         # Weight
         self.add('SysFuelWeight', SysFuelWeight(num_elem=self.num_elem))
         self.SysFuelWeight.fuel_w = np.linspace(1.0, 0.0, self.num_elem+1)
 
-        self.connect('SysSpeed.v', 'SysFuelWeight.v')
-        self.connect('SysGammaBspline.Gamma', 'SysFuelWeight.Gamma')
-        self.connect('SysCTTar.CT_tar', 'SysFuelWeight.CT_tar')
-        self.connect('SysXBspline.x', 'SysFuelWeight.x')
-        self.connect('SysSFC.SFC', 'SysFuelWeight.SFC')
-        self.connect('SysRho.rho', 'SysFuelWeight.rho')
-        self.connect('S', 'SysFuelWeight.S')
-
         # ------------------------------------------------
         # Coupled Analysis - Newton for outer loop
         # TODO: replace with GS/Newton cascaded solvers when working
@@ -194,13 +231,6 @@ class MissionSegment(Assembly):
 
         self.add('coupled_solver', NewtonSolver())
 
-        # Direct connections (cycles) are faster.
-        self.connect('SysFuelWeight.fuel_w', 'SysCLTar.fuel_w')
-        self.connect('SysCTTar.CT_tar', 'SysCLTar.CT_tar')
-        self.connect('SysTripanCLSurrogate.alpha', 'SysCLTar.alpha')
-        self.connect('SysTripanCMSurrogate.eta', 'SysTripanCLSurrogate.eta')
-        self.connect('SysFuelWeight.fuel_w', 'SysCTTar.fuel_w')
-
         #self.coupled_solver.add_parameter('SysCLTar.fuel_w')
         #self.coupled_solver.add_constraint('SysFuelWeight.fuel_w = SysCLTar.fuel_w')
         #self.coupled_solver.add_parameter('SysCLTar.CT_tar')
@@ -231,23 +261,8 @@ class MissionSegment(Assembly):
         self.add('SysFuelObj', SysFuelObj(num_elem=self.num_elem))
         self.add('SysBlockTime', SysBlockTime(num_elem=self.num_elem))
 
-        self.connect('S', 'SysTau.S')
-        self.connect('thrust_sl', 'SysTau.thrust_sl')
-        self.connect('SysRho.rho', 'SysTau.rho')
-        self.connect('SysCTTar.CT_tar', 'SysTau.CT_tar')
-        self.connect('SysHBspline.h', 'SysTau.h')
-        self.connect('SysSpeed.v', 'SysTau.v')
-        self.connect('SysTau.tau', 'SysTmin.tau')
-        self.connect('SysTau.tau', 'SysTmax.tau')
-        #self.connect('SysGammaBspline.Gamma', 'SysSlopeMin.Gamma')
-        #self.connect('SysGammaBspline.Gamma', 'SysSlopeMax.Gamma')
-        self.connect('SysFuelWeight.fuel_w', 'SysFuelObj.fuel_w')
-        #self.connect('SysHBspline.h', 'SysHi.h')
-        #self.connect('SysHBspline.h', 'SysHf.h')
-        self.connect('SysXBspline.x', 'SysBlockTime.x')
-        self.connect('SysSpeed.v', 'SysBlockTime.v')
-        self.connect('SysGammaBspline.Gamma', 'SysBlockTime.Gamma')
-
+        for src, target in _CONNECTIONS:
+            self.connect(src, target)
 
         # Promote useful variables to the boundary.
         self.create_passthrough('SysHBspline.h_pt')
@@ -290,15 +305,25 @@ class MissionSegment(Assembly):
         self.coupled_solver.gradient_options.maxiter = 50
         self.coupled_solver.iprint = 2
         self.coupled_solver.gradient_options.iprint = 1
+        # Matrix-free: KSP only calls apply_deriv on the coupled comps, so
+        # there is no assembled jacobian or factorization to set up.
         self.coupled_solver.gradient_options.lin_solver = 'petsc_ksp'
 
     def set_init_h_pt(self, h_init_pt):
         ''' Solve for a good initial altitude profile.'''
-        A = self.jac_h
-        b = h_init_pt
-        ATA = A.T.dot(A)
-        ATb = A.T.dot(b)
-        self.h_pt = scipy.sparse.linalg.gmres(ATA, ATb)[0]
+        self.h_pt = self._get_pinv(self.jac_h).dot(h_init_pt)
+
+    @classmethod
+    def _get_pinv(cls, A):
+        ''' Return the (dense, num_cp x num_elem+1) pseudo-inverse of the
+        altitude jacobian, so the least-squares fit of the control points is a
+        single product. It is shared by all segments that share the same
+        jacobian.'''
+        key = id(A)
+        if key not in cls._pinvs or cls._pinvs[key][0] is not A:
+            cls._pinvs[key] = (A, np.linalg.pinv(A.toarray()))
+
+        return cls._pinvs[key][1]
 
 if __name__ == "__main__":
 
@@ -342,7 +367,7 @@ if __name__ == "__main__":
         from time import time
         t1 = time()
         model.run()
-        print "Elapsed time:", time()-t1
+        print("Elapsed time:", time()-t1)
     else:
         import cProfile
         import pstats
@@ -352,7 +377,7 @@ if __name__ == "__main__":
         p.strip_dirs()
         p.sort_stats('time')
         p.print_stats()
-        print '\n\n---------------------\n\n'
+        print('\n\n---------------------\n\n')
         p.print_callers()
-        print '\n\n---------------------\n\n'
+        print('\n\n---------------------\n\n')
         p.print_callees()
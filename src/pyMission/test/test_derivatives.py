@@ -20,6 +20,7 @@ from pyMission.functionals import SysTmin, SysTmax, SysSlopeMin, SysSlopeMax, \
                                   SysFuelObj, \
                                   SysBlockTime
 from pyMission.propulsion import SysSFC, SysTau
+from pyMission.segment import MissionSegment
 
 
 # Ignore the numerical warnings from performing the rel error calc.
@@ -257,6 +258,30 @@ class Testcase_pyMission_derivs(unittest.TestCase):
         self.run_model()
         self.compare_derivatives()
 
+    def test_setup_MBI_cache(self):
+
+        x_init = 100.0*(1 - np.cos(np.linspace(0, 1, NUM_PT)*np.pi))/2/1e6
+        jac_h, jac_gamma = setup_MBI(12+1, NUM_PT, x_init)
+        jac_h2, jac_gamma2 = setup_MBI(12+1, NUM_PT, x_init.copy())
+
+        self.assertTrue(jac_h is jac_h2)
+        self.assertTrue(jac_gamma is jac_gamma2)
+
+        jac_h3, jac_gamma3 = setup_MBI(12+1, NUM_PT, 2.0*x_init)
+        self.assertFalse(jac_gamma is jac_gamma3)
+
+    def test_set_init_h_pt(self):
+
+        x_init = 100.0*(1 - np.cos(np.linspace(0, 1, NUM_PT)*np.pi))/2/1e6
+        model = set_as_top(MissionSegment(num_elem=12, num_cp=NUM_PT,
+                                          x_pts=x_init, surr_file='../crm_surr'))
+
+        # A profile in the spline space should be fit exactly.
+        h_pt = np.linspace(1.0, 2.0, NUM_PT) + np.sin(np.arange(NUM_PT))
+        model.set_init_h_pt(model.jac_h.dot(h_pt))
+
+        assert_rel_error(self, np.max(np.abs(model.h_pt - h_pt)), 0.0, 1e-10)
+
     def test_SysTau(self):
 
         compname = 'SysTau'
@@ -308,6 +333,28 @@ class Testcase_pyMission_derivs(unittest.TestCase):
         self.run_model()
         self.compare_derivatives()
 
+    def test_setup_surrogate_cache(self):
+
+        surr = '../crm_surr'
+        CL_arr, CD_arr, CM_arr, num = setup_surrogate(surr)
+        CL_arr2, CD_arr2, CM_arr2, num2 = setup_surrogate(surr)
+
+        self.assertTrue(CL_arr is CL_arr2)
+        self.assertTrue(CD_arr is CD_arr2)
+        self.assertTrue(CM_arr is CM_arr2)
+        self.assertEqual(num, num2)
+
+        inputs = np.zeros((NUM_ELEM+1, 4))
+        inputs[:, 0] = 0.8 + .1*np.random.random(NUM_ELEM+1)
+        inputs[:, 1] = np.random.random(NUM_ELEM+1)
+        inputs[:, 2] = 3.28e4*np.random.random(NUM_ELEM+1)
+        inputs[:, 3] = np.random.random(NUM_ELEM+1)
+
+        for arr, arr2 in [(CL_arr, CL_arr2), (CD_arr, CD_arr2),
+                          (CM_arr, CM_arr2)]:
+            self.assertTrue(np.array_equal(arr.evaluate(inputs),
+                                           arr2.evaluate(inputs)))
+
     def test_SysTripanCLSurrogate(self):
 
         surr = '../crm_surr'